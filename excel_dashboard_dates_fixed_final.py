@@ -1,7 +1,13 @@
+import re
+
 import streamlit as st
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
+import altair as alt
+import ciso8601
 from io import BytesIO
+from python_calamine import CalamineWorkbook
 
 st.set_page_config(page_title="Excel Dashboard", layout="wide")
 st.title("📊 Excel Dashboard Tool")
@@ -9,21 +15,142 @@ st.title("📊 Excel Dashboard Tool")
 # ----------------------------------------------------
 # EXCEL DATE FIXER
 # ----------------------------------------------------
+_DMY_RE = re.compile(r"^\d{1,2}/\d{1,2}/\d{4}$")
+_ID_COL_RE = re.compile(r"(id|code)$", re.IGNORECASE)
+
+def serials_to_dt64(a):
+    # Excel serial day -> datetime64[ns] as one multiply+add; 25569 is
+    # the day offset from Excel's 1899-12-30 epoch to 1970-01-01.
+    a = a.astype("float64")
+    ns = np.where(np.isnan(a), 0.0, (a - 25569.0) * 86_400_000_000_000).astype("int64")
+    out = ns.view("datetime64[ns]")
+    out[np.isnan(a)] = np.datetime64("NaT")
+    return out
+
+def parse_text_dates(s):
+    sample = s.dropna()
+    first = sample.iloc[0] if not sample.empty else None
+    if isinstance(first, str) and _DMY_RE.match(first):
+        return pd.to_datetime(s, format="%d/%m/%Y", errors="coerce", cache=True)
+    try:
+        # ciso8601 parses ISO-ish strings ~4x faster than the dateutil
+        # fallback pd.to_datetime uses when no format is given.
+        parsed = np.fromiter(
+            (ciso8601.parse_datetime_as_naive(x) if isinstance(x, str) else None
+             for x in s.to_numpy()),
+            dtype="datetime64[ns]",
+            count=len(s),
+        )
+        return pd.Series(parsed, index=s.index)
+    except ValueError:
+        return pd.to_datetime(s, errors="coerce", cache=True)
+
 def fix_excel_dates(df):
-    for col in df.columns:
-        if pd.api.types.is_numeric_dtype(df[col]):
-            s = df[col].dropna()
-            if not s.empty and s.between(30000, 60000).all():
-                df[col] = pd.to_datetime(
-                    df[col],
-                    origin="1899-12-30",
-                    unit="D",
-                    errors="coerce"
-                )
-        elif df[col].dtype == object and "date" in col.lower():
-            df[col] = pd.to_datetime(df[col], errors="coerce")
+    # Detect Excel serial-date columns in one vectorized pass over the
+    # numeric block instead of a per-column dropna/between loop. Only
+    # float columns qualify (serials arrive as floats) — matched via
+    # dtype.kind so Arrow-backed floats count too — and id/code columns
+    # are excluded by name before any data is scanned.
+    num = df.select_dtypes(include="number")
+    if not num.empty:
+        num = num[[
+            c for c in num.columns
+            if num[c].dtype.kind == "f" and not _ID_COL_RE.search(str(c))
+        ]]
+    if not num.empty:
+        lo, hi = num.min(), num.max()
+        serial_cols = num.columns[(lo >= 30000) & (hi <= 60000) & num.notna().any()]
+        for col in serial_cols:
+            df[col] = serials_to_dt64(df[col].to_numpy())
+
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        if "date" in str(col).lower():
+            df[col] = parse_text_dates(df[col])
     return df
 
+# ----------------------------------------------------
+# DTYPE OPTIMIZATION
+# ----------------------------------------------------
+def categorize_text_columns(df):
+    # Low-cardinality text columns become category dtype so filter
+    # .isin() and uniquing run on integer codes instead of objects.
+    if len(df) == 0:
+        return df
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        if df[col].nunique(dropna=True) / len(df) < 0.5:
+            df[col] = df[col].astype("category")
+    return df
+
+def downcast_numeric_columns(df):
+    # Excel reads land as float64 across the board; shrinking to the
+    # smallest dtype cuts the bytes every later scan has to move.
+    for col in df.select_dtypes(include="number").columns:
+        downcasted = pd.to_numeric(df[col], downcast="integer")
+        if downcasted.dtype == df[col].dtype:
+            downcasted = pd.to_numeric(df[col], downcast="float")
+        df[col] = downcasted
+    return df
+
+# ----------------------------------------------------
+# CACHED EXCEL LOADING
+# ----------------------------------------------------
+@st.cache_data(show_spinner=False)
+def list_sheets(file_bytes):
+    # CalamineWorkbook reads only the workbook metadata, so the sheet
+    # selectbox never triggers a full parse.
+    return CalamineWorkbook.from_filelike(BytesIO(file_bytes)).sheet_names
+
+@st.cache_data(show_spinner=False)
+def load_sheet(file_bytes, sheet, header_row):
+    df = pd.read_excel(
+        BytesIO(file_bytes),
+        sheet_name=sheet,
+        header=header_row - 1,
+        engine="calamine",
+        dtype_backend="pyarrow"
+    )
+    df = fix_excel_dates(df)
+    df = downcast_numeric_columns(df)
+    return categorize_text_columns(df)
+
+# Per-column metadata for the filter widgets. The frame never changes
+# between uploads, so key the cache on the load parameters and skip
+# hashing the frame itself (leading underscore).
+@st.cache_data(show_spinner=False)
+def col_bounds(_df, df_key, col):
+    return _df[col].min(), _df[col].max()
+
+@st.cache_data(show_spinner=False)
+def aggregate_for_chart(_df, df_key, mask_hash, x_col, y_cols):
+    # Keyed on the filter mask and axis selection, so flipping chart
+    # type (or repeating identical filters) never re-runs the groupby.
+    # Grouping on every x dtype also caps the chart frame at the
+    # x-cardinality, keeping it under Altair's 5k-row transformer limit.
+    return _df.groupby(
+        x_col, sort=True, observed=True, as_index=False
+    )[list(y_cols)].sum(numeric_only=True)
+
+@st.cache_data(show_spinner=False)
+def col_uniques(_df, df_key, col):
+    s = _df[col]
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.categories.tolist()
+    return s.dropna().unique().tolist()
+
+# ----------------------------------------------------
+# PAGINATED TABLE VIEW
+# ----------------------------------------------------
+PAGE_SIZE = 1000
+
+def show_paginated(df, key):
+    # Ship one page to the browser per rerun instead of the whole frame.
+    pages = max(1, -(-len(df) // PAGE_SIZE))
+    page = st.number_input("Page", 1, pages, 1, key=key)
+    st.dataframe(
+        df.iloc[(page - 1) * PAGE_SIZE : page * PAGE_SIZE],
+        use_container_width=True
+    )
+
 # ----------------------------------------------------
 # FILE UPLOAD
 # ----------------------------------------------------
@@ -31,54 +158,78 @@ uploaded_file = st.file_uploader("Upload Excel file", type=["xlsx", "xls"])
 
 if uploaded_file:
     try:
-        xls = pd.ExcelFile(uploaded_file, engine="openpyxl")
-        sheet = st.selectbox("Select sheet", xls.sheet_names)
+        file_bytes = uploaded_file.getvalue()
+        sheet = st.selectbox("Select sheet", list_sheets(file_bytes))
         header_row = st.number_input("Header row (first row = 1)", min_value=1, value=1)
 
-        df = pd.read_excel(
-            xls,
-            sheet_name=sheet,
-            header=header_row - 1,
-            engine="openpyxl"
-        )
-
-        df = fix_excel_dates(df)
+        df = load_sheet(file_bytes, sheet, header_row)
+        df_key = (hash(file_bytes), sheet, header_row)
 
         st.success("File loaded successfully")
-        st.dataframe(df, use_container_width=True)
+        show_paginated(df, "preview_page")
 
         # ------------------------------------------------
         # FILTERS
         # ------------------------------------------------
         st.subheader("Filters")
-        filtered_df = df.copy()
 
         filter_cols = st.multiselect(
             "Select columns to filter",
-            filtered_df.columns.tolist()
+            df.columns.tolist()
         )
 
+        # Accumulate filters into one boolean mask (1 bit/row) and slice
+        # the frame once at the end instead of copying it per filter.
+        mask = np.ones(len(df), dtype=bool)
+
         for col in filter_cols:
-            if pd.api.types.is_numeric_dtype(filtered_df[col]):
-                min_v, max_v = filtered_df[col].min(), filtered_df[col].max()
+            if pd.api.types.is_numeric_dtype(df[col]):
+                min_v, max_v = col_bounds(df, df_key, col)
                 selected = st.slider(col, float(min_v), float(max_v), (float(min_v), float(max_v)))
-                filtered_df = filtered_df[filtered_df[col].between(*selected)]
+                # Arrow-backed columns with nulls yield <NA> from
+                # between(); force a plain bool array with nulls False.
+                mask &= df[col].between(*selected).to_numpy(dtype=bool, na_value=False)
 
-            elif pd.api.types.is_datetime64_any_dtype(filtered_df[col]):
-                min_d = filtered_df[col].min().date()
-                max_d = filtered_df[col].max().date()
+            # kind == "M" is an O(1) probe on the dtype object (no data
+            # access) and also matches Arrow-backed timestamp columns.
+            elif df[col].dtype.kind == "M":
+                min_d, max_d = col_bounds(df, df_key, col)
+                min_d, max_d = min_d.date(), max_d.date()
                 selected = st.date_input(col, [min_d, max_d])
-                filtered_df = filtered_df[
-                    filtered_df[col].dt.date.between(selected[0], selected[1])
-                ]
+                # Compare as datetime64 directly; .dt.date would box a
+                # Python date object per row just for the range check.
+                lo = np.datetime64(selected[0])
+                hi = np.datetime64(selected[1]) + np.timedelta64(1, "D")
+                values = df[col].to_numpy(
+                    dtype="datetime64[ns]", na_value=np.datetime64("NaT")
+                )
+                mask &= (values >= lo) & (values < hi)
 
             else:
-                values = filtered_df[col].dropna().unique().tolist()
+                values = col_uniques(df, df_key, col)
                 selected = st.multiselect(col, values, default=values)
-                filtered_df = filtered_df[filtered_df[col].isin(selected)]
+                mask &= df[col].isin(selected).to_numpy()
+
+        filtered_df = df.loc[mask]
+        mask_hash = hash(mask.tobytes())
 
         st.subheader(f"Filtered Data ({len(filtered_df)} rows)")
-        st.dataframe(filtered_df, use_container_width=True)
+        show_paginated(filtered_df, "filtered_page")
+
+        # ------------------------------------------------
+        # KPIs
+        # ------------------------------------------------
+        st.subheader("KPIs")
+
+        kpi_cols = filtered_df.select_dtypes(include="number").columns.tolist()
+        if kpi_cols:
+            # One agg call walks each column once for all three stats.
+            kpi_df = (
+                filtered_df[kpi_cols]
+                .agg(["sum", "mean", "count"])
+                .T.rename(columns={"sum": "Sum", "mean": "Average", "count": "Count"})
+            )
+            st.dataframe(kpi_df, use_container_width=True)
 
         # ------------------------------------------------
         # CHARTS
@@ -89,13 +240,19 @@ if uploaded_file:
         x_col = st.selectbox("X-axis", filtered_df.columns)
         y_cols = st.multiselect("Y-axis", numeric_cols)
         chart_type = st.selectbox("Chart type", ["Line", "Bar", "Pie", "Combo (Bar + Line)"])
+        png_export = st.checkbox("Enable PNG download (renders server-side)")
 
         if st.button("Generate Chart") and y_cols:
+            # One cached aggregation feeds every chart type.
+            plot_df = aggregate_for_chart(
+                filtered_df, df_key, mask_hash, x_col, tuple(y_cols)
+            )
 
             # ---------- PIE (FIXED) ----------
             if chart_type == "Pie":
                 for col in y_cols:
-                    pie_data = filtered_df.groupby(x_col)[col].sum()
+                    # plot_df is already one row per x value.
+                    pie_data = plot_df.set_index(x_col)[col]
 
                     fig, ax = plt.subplots()
                     ax.pie(
@@ -109,35 +266,62 @@ if uploaded_file:
 
             # ---------- LINE / BAR / COMBO ----------
             else:
-                plot_df = filtered_df.copy()
-
-                if pd.api.types.is_datetime64_any_dtype(plot_df[x_col]):
-                    plot_df = plot_df.sort_values(by=x_col)
-                    plot_df = plot_df.groupby(x_col, as_index=False)[y_cols].sum()
-
-                df_chart = plot_df.set_index(x_col)[y_cols]
+                # Altair serializes the aggregated frame as JSON and
+                # renders client-side, so no server raster pass is needed.
+                long_df = plot_df.melt(
+                    id_vars=[x_col],
+                    value_vars=y_cols,
+                    var_name="Series",
+                    value_name="Value",
+                )
 
-                fig, ax = plt.subplots(figsize=(10, 4))
+                base = alt.Chart(long_df).encode(
+                    x=x_col,
+                    y="Value",
+                    color="Series"
+                )
 
                 if chart_type == "Line":
-                    df_chart.plot.line(ax=ax)
+                    chart = base.mark_line()
                 elif chart_type == "Bar":
-                    df_chart.plot.bar(ax=ax)
+                    chart = base.mark_bar()
                 else:
-                    df_chart.plot.bar(ax=ax, alpha=0.6)
-                    df_chart.plot.line(ax=ax, secondary_y=True)
+                    chart = base.mark_bar(opacity=0.6) + base.mark_line()
+
+                st.altair_chart(chart, use_container_width=True)
+
+                if png_export:
+                    df_chart = plot_df.set_index(x_col)[y_cols]
 
-                ax.set_xlabel(x_col)
-                ax.set_ylabel(", ".join(y_cols))
-                plt.tight_layout()
+                    fig, ax = plt.subplots(figsize=(10, 4))
 
-                st.pyplot(fig)
+                    if chart_type == "Line":
+                        df_chart.plot.line(ax=ax)
+                    elif chart_type == "Bar":
+                        df_chart.plot.bar(ax=ax)
+                    else:
+                        df_chart.plot.bar(ax=ax, alpha=0.6)
+                        df_chart.plot.line(ax=ax, secondary_y=True)
 
-                buffer = BytesIO()
-                fig.savefig(buffer, format="png")
-                buffer.seek(0)
+                    ax.set_xlabel(x_col)
+                    ax.set_ylabel(", ".join(y_cols))
+                    plt.tight_layout()
+
+                    # Reuse one buffer across reruns; a low compress level
+                    # skips most of libpng's per-row filter search, which
+                    # dominates encode time on flat plot imagery.
+                    buffer = st.session_state.setdefault("chart_png_buffer", BytesIO())
+                    buffer.seek(0)
+                    buffer.truncate(0)
+                    fig.savefig(
+                        buffer,
+                        format="png",
+                        dpi=96,
+                        pil_kwargs={"compress_level": 3, "optimize": False},
+                    )
+                    buffer.seek(0)
 
-                st.download_button("⬇️ Download chart", buffer, "chart.png")
+                    st.download_button("⬇️ Download chart", buffer, "chart.png")
 
     except Exception as e:
         st.error(f"Error: {e}")